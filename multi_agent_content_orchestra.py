@@ -1,18 +1,70 @@
 # Core libraries and third-party imports used across the pipeline
 from crewai import Crew, Task, Agent
+from crewai.tasks.task_output import TaskOutput
 from crewai_tools import SerperDevTool
+from ibm_watsonx_ai import APIClient
+from ibm_watsonx_ai.foundation_models import ModelInference
+import ibm_watsonx_ai._wrappers.requests as wx_requests
+from langchain.globals import set_llm_cache
+from langchain_community.cache import SQLiteCache
 from langchain_ibm import WatsonxLLM
 from pptx import Presentation
+from pydantic.v1 import BaseModel, Field
 
+import argparse
+import functools
+import hashlib
+import json
+import logging
 import os
+import re
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple, Type, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from watsonx_batch import generate_as_completed, generate_text
 
 # Create folder for output files
-OUTPUT_DIR = "content_output"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+OUTPUT_DIR = Path("content_output")
+OUTPUT_DIR.mkdir(exist_ok=True)
+
+# Output artifacts, in pipeline order
+RESEARCH_FILE = OUTPUT_DIR / "01_research_notes.txt"
+NARRATIVE_FILE = OUTPUT_DIR / "02_core_narrative.txt"
+RAW_PACK_FILE = OUTPUT_DIR / "03_multiformat_content_pack_raw.txt"
+FINAL_PACK_FILE = OUTPUT_DIR / "04_multiformat_content_pack_final.txt"
+SLIDE_OUTLINE_FILE = OUTPUT_DIR / "slide_outline.txt"
+SLIDES_FILE = OUTPUT_DIR / "slides.pptx"
 
 # ================================
 # CONFIG
 # ================================
+# Command-line options (the topic itself is asked for interactively below)
+parser = argparse.ArgumentParser(description="Turn a topic into a researched multi-format content pack.")
+parser.add_argument(
+    "--force",
+    action="store_true",
+    help="ignore cached task outputs and LLM responses and regenerate everything",
+)
+parser.add_argument(
+    "--two-stage",
+    action="store_true",
+    help="draft and edit each format with separate LLM calls (writes the raw pack too, for A/B quality checks)",
+)
+args = parser.parse_args()
+
+# Status messages go through one logging handler instead of individual print() calls
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+log = logging.getLogger(__name__)
+
 # Recommended: set these in your terminal before running, e.g.:
 # export WATSONX_APIKEY="your-real-key"
 # export SERPER_API_KEY="your-real-serper-key"
@@ -27,54 +79,210 @@ os.environ["SERPER_API_KEY"] = "YOUR_SERPER_API_KEY_HERE"
 # - max_new_tokens controls the maximum length of generated text
 params = {"decoding_method": "greedy", "max_new_tokens": 500}
 
+# Per-task max_new_tokens budgets
+# Decode time grows with the token budget, so each task only gets roughly what its output needs.
+# Formats are looked up by their slug (see FORMAT_SLUGS); "edit" covers every editor call.
+# Formatter/editor calls that run out of budget before END_MARKER are logged as [truncated].
+TOKEN_BUDGET = {
+    "research": 700,
+    "narrative": 1500,
+    "keynote": 900,
+    "linkedin": 200,
+    "youtube": 1200,
+    "slides": 600,
+    "edit": 1500,
+}
+
+# Formatter/editor prompts ask the model to finish with END_MARKER, which is also a stop sequence,
+# so watsonx stops generating as soon as the text is done. The marker is not included in the output.
+END_MARKER = "[END]"
+FMT_PARAMS = {
+    "decoding_method": "greedy",
+    "stop_sequences": [END_MARKER],
+    "include_stop_sequence": False,
+}
+
 # IBM Cloud watsonx.ai config (Frankfurt / eu-de)
 # URL and PROJECT_ID correspond to your IBM Cloud project and region.
 #In the workspace where you create the watsonx_apikey, create a project and copy the project id here.
 URL = "https://eu-de.ml.cloud.ibm.com"
 PROJECT_ID = ""  # Amrita's sandbox (with associated service)
 
-
-# Topic for the content pipeline – user-provided at runtime
-TOPIC = input("Enter the topic you want to generate content for: ").strip()
-
-# Safety fallback in case user hits enter
-if not TOPIC:
-    raise ValueError("Topic cannot be empty. Please run again and enter a valid topic.")
+# Models for the long-output stages (formatter and heavy editor pass)
+# These stages generate most of the tokens in a run, and decoding is bound by memory bandwidth,
+# so a quantized (FP8/INT8) deployment of the 70B model can nearly double their throughput.
+# If your watsonx project offers one, set its model id here. FMT_MODEL_ID runs the default
+# draft-then-polish calls. EDIT_MODEL_ID is only used with --two-stage, where editing is a
+# separate call: editing tolerates quantization noise best, so if the formatter output degrades
+# there, switch only EDIT_MODEL_ID and keep the full-precision formatter.
+# The research and narrative stages always use the main LLM.
+FMT_MODEL_ID = os.environ.get("WATSONX_FMT_MODEL_ID", "meta-llama/llama-3-3-70b-instruct")
+EDIT_MODEL_ID = os.environ.get("WATSONX_EDIT_MODEL_ID", FMT_MODEL_ID)
+
+# Persistent LLM response cache
+# Every LLM call (agent steps and concurrent formatter/editor prompts) is looked up in a local
+# SQLite database keyed by the exact prompt plus the model parameters. The prompt already
+# contains the agent role, TOPIC and task, so re-running with the same topic skips watsonx.
+# Run with --force to bypass it (and the task cache below) for a fresh generation.
+CACHE_DIR = OUTPUT_DIR / ".cache"
+CACHE_DIR.mkdir(exist_ok=True)
+if not args.force:
+    set_llm_cache(SQLiteCache(database_path=str(CACHE_DIR / "llm_cache.sqlite")))
+
+# Content-addressed task outputs, see CachedTask
+TASK_CACHE_DIR = CACHE_DIR / "tasks"
+TASK_CACHE_DIR.mkdir(exist_ok=True)
 
 
 # ================================
 # LLMs
 # ================================
 
+# Shared HTTP connection pool for the watsonx SDK
+# The SDK sends every request through module-level requests.get/post calls, which open a new
+# TCP + TLS connection each time. Routing them through one keep-alive Session lets all LLM calls
+# (including the concurrent requests of a batch) reuse warm connections to the watsonx endpoint.
+# urllib3 already sets TCP_NODELAY on its sockets.
+def use_pooled_http_session(pool_size: int = 10) -> None:
+    """Send the watsonx SDK's HTTP requests through a shared keep-alive requests.Session.
+
+    pool_size matches the SDK's default concurrency_limit for batched generation.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+
+    # Only the request functions are swapped; Session/exceptions still come from requests
+    # because the SDK uses them directly (e.g. for streaming).
+    wx_requests.requests = SimpleNamespace(
+        Session=requests.Session,
+        packages=requests.packages,
+        exceptions=requests.exceptions,
+        get=session.get,
+        options=session.options,
+        head=session.head,
+        post=session.post,
+        put=session.put,
+        patch=session.patch,
+        delete=session.delete,
+    )
+
+
+use_pooled_http_session()
+
+# One API client shared by all models
+# Authenticating once means a single IAM token exchange for the whole run; the client refreshes
+# the bearer token itself when it expires, instead of every model holding its own.
+# The clients, models and tools below are built by cached factories on first use. The one
+# exception is the watsonx client itself: it is warmed up in the background while the topic is
+# being typed (see warm_up_wx_client()), so the IAM token exchange and model spec lookup happen
+# even if the topic turns out to be empty. Models and Serper are not used until a valid topic
+# has been entered.
+@functools.cache
+def get_wx_client() -> APIClient:
+    return APIClient(
+        {"url": URL, "apikey": os.environ["WATSONX_APIKEY"]},
+        project_id=PROJECT_ID,
+        verify=False,  # TODO: remove when SSL certs are configured properly (enables SSL verification)
+    )
+
+
+# Model spec validation
+# ModelInference looks up the model spec on watsonx (a blocking GET) whenever it is built with
+# validate=True. Several factories below build one instance per token budget for the same model,
+# so only the first instance of each model id is validated; the rest are built without a request.
+validated_model_ids = set()
+
+
+def build_model_inference(model_id: str, model_params: dict) -> ModelInference:
+    """Build a ModelInference on the shared client, validating each model id only once."""
+    model = ModelInference(
+        model_id=model_id,
+        params=model_params,
+        api_client=get_wx_client(),
+        validate=model_id not in validated_model_ids,
+    )
+    validated_model_ids.add(model_id)
+    return model
+
+
 # Main reasoning / writing LLM
-# This is the primary model used for research and core writing.
-llm = WatsonxLLM(
-    model_id="meta-llama/llama-3-3-70b-instruct",  # supported in your env
-    url=URL,
-    params=params,
-    project_id=PROJECT_ID,
-    verify=False,  # TODO: remove when SSL certs are configured properly (enables SSL verification)
-)
+# This is the primary model used for research and core writing (one instance per token budget).
+@functools.cache
+def get_llm(max_new_tokens: int = params["max_new_tokens"]) -> WatsonxLLM:
+    return WatsonxLLM(
+        watsonx_model=build_model_inference(
+            "meta-llama/llama-3-3-70b-instruct",  # supported in your env
+            {**params, "max_new_tokens": max_new_tokens},
+        )
+    )
+
 
 # Function-calling / tools LLM (smaller, more structured)
 # This model is used when tools (like web search) need to be invoked deterministically.
-function_calling_llm = WatsonxLLM(
-    model_id="mistralai/mistral-small-3-1-24b-instruct-2503",
-    url=URL,
-    params={**params, "temperature": 0.1},  # lower temperature -> more deterministic behavior
-    project_id=PROJECT_ID,
-    verify=False,
-)
+@functools.cache
+def get_function_calling_llm() -> WatsonxLLM:
+    return WatsonxLLM(
+        watsonx_model=build_model_inference(
+            "mistralai/mistral-small-3-1-24b-instruct-2503",
+            {**params, "temperature": 0.1},  # lower temperature -> more deterministic behavior
+        )
+    )
+
+
+# Formatter/editor LLM
+# Uses FMT_PARAMS (stop at END_MARKER) with the token budget of the format or edit it runs.
+# One instance per model id and budget, so calls with the same settings share it.
+@functools.cache
+def get_fmt_llm(model_id: str = FMT_MODEL_ID, max_new_tokens: int = TOKEN_BUDGET["edit"]) -> WatsonxLLM:
+    return WatsonxLLM(
+        watsonx_model=build_model_inference(model_id, {**FMT_PARAMS, "max_new_tokens": max_new_tokens})
+    )
+
+
+# Lighter editor LLM for the polish pass
+# Same model as the function-calling LLM (24B vs 70B, so decoding is much faster) with the
+# editor params and budget. Used for drafts that only need light polishing, see needs_heavy_edit().
+@functools.cache
+def get_editor_llm_small() -> WatsonxLLM:
+    return WatsonxLLM(
+        watsonx_model=build_model_inference(
+            "mistralai/mistral-small-3-1-24b-instruct-2503",
+            {**FMT_PARAMS, "max_new_tokens": TOKEN_BUDGET["edit"]},
+        )
+    )
 
-# Bigger token budget for formatter/editor
-# This variant has a higher max_new_tokens limit to handle longer edits/formatting tasks.
-fmt_llm = WatsonxLLM(
-    model_id="meta-llama/llama-3-3-70b-instruct",
-    url=URL,
-    params={"decoding_method": "greedy", "max_new_tokens": 1500},
-    project_id=PROJECT_ID,
-    verify=False,
-)
+
+# ================================
+# TOPIC
+# ================================
+
+# Warm up the watsonx client (IAM token exchange, model spec lookup) in the background
+# while the user is still typing the topic.
+def warm_up_wx_client() -> None:
+    """Build the shared watsonx client, ignoring errors.
+
+    A failure is not cached by functools.cache, so the first real get_wx_client() call
+    retries and reports it, instead of a traceback interrupting the topic prompt.
+    """
+    try:
+        get_wx_client()
+    except Exception:
+        pass
+
+
+client_warmup = threading.Thread(target=warm_up_wx_client, daemon=True)
+client_warmup.start()
+
+# Topic for the content pipeline – user-provided at runtime
+TOPIC = input("Enter the topic you want to generate content for: ").strip()
+
+# Safety fallback in case user hits enter
+if not TOPIC:
+    raise ValueError("Topic cannot be empty. Please run again and enter a valid topic.")
+
+# Let the warm-up finish so every factory below reuses the same client
+client_warmup.join()
 
 
 # ================================
@@ -83,36 +291,85 @@ fmt_llm = WatsonxLLM(
 
 # Web search tool (Serper API) used by the researcher agent to fetch live information.
 #You may add more tools here as per the requirement.
-search = SerperDevTool()
+@functools.cache
+def get_search() -> SerperDevTool:
+    return SerperDevTool()
+
+
+# Batched web search tool
+# The researcher usually needs several searches; running them one tool call at a time costs one
+# Serper round trip (plus one agent step) each. This tool takes a list of queries and sends them
+# to Serper concurrently, returning all results in a single observation.
+MAX_PARALLEL_SEARCHES = 5  # upper bound on concurrent Serper requests per tool call
+
+
+class SerperBatchSearchToolSchema(BaseModel):
+    """Input for SerperBatchSearchTool."""
+    search_queries: List[str] = Field(..., description="Mandatory list of search queries you want to run on the internet at the same time")
+
+
+class SerperBatchSearchTool(SerperDevTool):
+    name: str = "Search the internet for several queries at once"
+    description: str = "A tool that runs several internet searches in parallel and returns the results for every query."
+    args_schema: Type[BaseModel] = SerperBatchSearchToolSchema
+
+    def _run(self, search_queries: Union[List[str], str], **kwargs: Any) -> str:
+        # CrewAI does not validate tool arguments against args_schema, and the function-calling
+        # LLM often sends a single string; treat it as one query instead of one per character.
+        if isinstance(search_queries, str):
+            search_queries = [search_queries]
+
+        # Drop blank and duplicate queries, keeping the original order
+        queries = list(dict.fromkeys(q.strip() for q in search_queries if q and q.strip()))
+        if not queries:
+            return "No search queries were given."
+
+        search_one = super()._run  # single-query Serper search
+        with ThreadPoolExecutor(max_workers=min(len(queries), MAX_PARALLEL_SEARCHES)) as executor:
+            results = list(executor.map(lambda query: search_one(search_query=query), queries))
+
+        return "\n".join(f"Query: {query}\n{result}" for query, result in zip(queries, results))
+
+
+@functools.cache
+def get_batch_search() -> SerperBatchSearchTool:
+    return SerperBatchSearchTool()
 
 
 # ================================
 # AGENTS
 # ================================
 
+# Agent roles, goals and backstories contain no TOPIC: CrewAI puts them at the very start of every
+# prompt, and keeping that prefix identical across runs lets watsonx reuse it (prefix/KV caching).
+# The topic only appears in the task descriptions below, after a "---" line.
+
 # 1) Researcher – finds and structures real information
 # This agent is responsible for doing web research and extracting key insights.
 researcher = Agent(
-    llm=llm,
-    function_calling_llm=function_calling_llm,
+    llm=get_llm(TOKEN_BUDGET["research"]),
+    function_calling_llm=get_function_calling_llm(),
     role="Senior AI Researcher",
-    goal=f"Research the topic '{TOPIC}' using the web and extract the most important, recent, and practical insights.",
+    goal=(
+        "Research the given topic using the web and extract the most important, recent, and practical insights. "
+        "When you need more than one search, run them together with the batch search tool."
+    ),
     backstory=(
         "You are a veteran AI researcher with experience in industry and academia. "
         "You care about credible sources, practical relevance, and clear structure."
     ),
     allow_delegation=False,  # this agent does not delegate work to other agents
-    tools=[search],          # the web search tool is available to this agent
+    tools=[get_search(), get_batch_search()],  # single and batched web search tools
     verbose=1,               # verbosity controls how much logging CrewAI prints
 )
 
 # 2) Core Writer – builds the master narrative
 # This agent takes the research notes and turns them into a cohesive explanation.
 core_writer = Agent(
-    llm=llm,
+    llm=get_llm(TOKEN_BUDGET["narrative"]),
     role="Content Architect",
     goal=(
-        f"Turn the research about '{TOPIC}' into a clear, structured explanation that can be reused in multiple formats."
+        "Turn the research about the given topic into a clear, structured explanation that can be reused in multiple formats."
     ),
     backstory=(
         "You are excellent at teaching complex technical concepts to mixed audiences. "
@@ -122,270 +379,450 @@ core_writer = Agent(
     verbose=1,
 )
 
-# 3) Formatter – creates the 6 content formats
-# This agent repurposes the core narrative into multiple content types (speech, post, script, slides, etc.).
-formatter = Agent(
-    llm=fmt_llm,
-    role="Multi-format Content Strategist",
-    goal=(
-        f"Convert the core narrative about '{TOPIC}' into multiple content formats "
-        "that are immediately usable on stage, on LinkedIn, in video, and in business contexts."
-    ),
-    backstory=(
-        "You are a content strategist who knows how to repurpose one strong idea into many formats. "
-        "You understand how speakers, founders, and leaders communicate on different channels."
-    ),
-    allow_delegation=False,
-    verbose=1,
+# 3) Formatter and 4) Editor
+# These two stages only transform text and never call tools, so they are not run as CrewAI agents
+# (one agent loop and one LLM request per task). Their prompts are sent to watsonx concurrently instead,
+# see generate_content_pack(). The personas below take the place of an agent's role and backstory.
+FORMATTER_PERSONA = (
+    "You are a Multi-format Content Strategist who knows how to repurpose one strong idea into many formats. "
+    "You understand how speakers, founders, and leaders communicate on different channels."
 )
 
-# 4) Editor – polishes all outputs
-# This agent is the final quality pass to refine tone, clarity, and consistency across all formats.
-editor = Agent(
-    llm=fmt_llm,
-    role="Senior Editor",
-    goal=(
-        "Polish all generated content for clarity, conciseness, and impact while preserving meaning. "
-        "Make sure everything flows well and feels coherent as one content pack."
-    ),
-    backstory=(
-        "You are an experienced editor who has worked on talks, posts, decks, and executive summaries. "
-        "You eliminate fluff and keep the strongest ideas and phrasing."
-    ),
-    allow_delegation=False,
-    verbose=1,
+EDITOR_PERSONA = (
+    "You are a Senior Editor who has worked on talks, posts, decks, and executive summaries. "
+    "You eliminate fluff and keep the strongest ideas and phrasing."
+)
+
+# Single persona for the fused draft-then-polish prompt (default flow, see build_fused_prompt())
+WRITER_EDITOR_PERSONA = (
+    "You are a Multi-format Content Strategist and Senior Editor who repurposes one strong idea "
+    "into talks, posts, scripts, and decks, then tightens each piece until only the strongest ideas "
+    "and phrasing remain."
 )
 
 # ================================
 # TASKS
 # ================================
 
+# Research and narrative tasks cache their whole output
+# A rerun with the same topic skips these tasks entirely (including the web searches, which the
+# LLM cache cannot skip) and goes straight to the first stage whose inputs changed.
+class CachedTask(Task):
+    """A Task whose output is stored under a content-addressed key and reused on later runs.
+
+    The key hashes everything that goes into the agent's prompt: the task prompt (description,
+    which already contains TOPIC, plus expected output), the agent's role, goal, backstory and
+    tool names, its model id and generation params (e.g. max_new_tokens), and the context handed
+    in by the previous task. A change to any of them (or to an upstream output) recomputes it.
+    """
+
+    def cache_key(self, context: Optional[str] = None) -> str:
+        agent = self.agent
+        model_id = getattr(agent.llm, "model_id", "")
+        llm_params = json.dumps(getattr(agent.llm, "params", None) or {}, sort_keys=True, default=str)
+        tool_names = ",".join(tool.name for tool in agent.tools or [])
+        key = "\n".join([
+            model_id, llm_params,
+            agent.role, agent.goal, agent.backstory, tool_names,
+            self.prompt(), context or "",
+        ])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def execute(self, agent=None, context: Optional[str] = None, tools=None) -> str:
+        cached = TASK_CACHE_DIR / f"{self.cache_key(context)}.txt"
+        if cached.exists() and not args.force:
+            result = cached.read_text()
+            self.output = TaskOutput(description=self.description, exported_output=result, raw_output=result)
+            if self.output_file:
+                self._save_file(result)  # keep the usual artifact in OUTPUT_DIR up to date
+            log.info(f"[cache] Reusing cached output for {self.output_file or self.description[:40]}")
+            return result
+
+        result = super().execute(agent=agent, context=context, tools=tools)
+        cached.write_text(result)
+        return result
+
+
+# Each prompt below starts with its static instructions and ends with the dynamic part
+# (TOPIC, narrative, draft) after a "---" line, so consecutive calls share the longest possible prefix.
+
 # Task 1 – Research the topic using the web
 # Input: TOPIC
 # Output: structured research notes in bullet form, saved to 01_research_notes.txt
-task_research = Task(
+task_research = CachedTask(
     description=(
-        f"Use web search to research the topic '{TOPIC}'. "
+        "Use web search to research the topic given after the --- line. "
         "Identify 5–10 key insights, trends, or important points.\n\n"
         "For each insight, include:\n"
         "- A short title\n"
         "- 2–3 sentence explanation\n"
         "- Why it matters in practice\n"
-        "If possible, briefly reference where the insight comes from (e.g., company, paper, or blog)."
+        "If possible, briefly reference where the insight comes from (e.g., company, paper, or blog).\n\n"
+        f"---\nTopic: {TOPIC}"
     ),
     expected_output=(
         "A structured set of 5–10 bullet points. Each bullet should include: "
         "a title, explanation, and why it matters. This will be used as the factual base."
     ),
-    output_file=f"{OUTPUT_DIR}/01_research_notes.txt",  # Task output is written to this file
+    output_file=str(RESEARCH_FILE),  # Task output is written to this file
     agent=researcher,                      # Agent responsible for this task
 )
 
 # Task 2 – Create a core narrative (master explanation)
 # Uses the research notes from Task 1 to produce an 800–1200 word narrative.
-task_core_narrative = Task(
+task_core_narrative = CachedTask(
     description=(
-        f"Using the research notes, write a clear, structured explanation of '{TOPIC}'. "
+        "Using the research notes, write a clear, structured explanation of the topic given after the --- line. "
         "Assume the reader is technical but not an expert in agentic AI.\n\n"
         "Include sections:\n"
         "1. What is the topic and why now?\n"
         "2. Key concepts and frameworks (with simple analogies).\n"
         "3. Where it is used in practice (examples).\n"
         "4. Benefits and limitations.\n"
-        "5. How this fits into the bigger AI landscape."
+        "5. How this fits into the bigger AI landscape.\n\n"
+        f"---\nTopic: {TOPIC}"
     ),
     expected_output=(
         "A 800–1200 word narrative that explains the topic clearly and can be reused for speech, posts, and scripts."
     ),
-    output_file=f"{OUTPUT_DIR}/02_core_narrative.txt",
+    output_file=str(NARRATIVE_FILE),
     agent=core_writer,
 )
 
 # Task 3 – Generate the multi-format content pack
 # Transforms the core narrative into different content formats for various channels.
-task_multiformat = Task(
-    description=(
-        "Based on the core narrative, create the following SIX distinct outputs.\n\n"
-        "1) KEYNOTE SPEECH:\n"
+# One prompt per format; all four are generated concurrently.
+FORMAT_SPECS = {
+    "[KEYNOTE SPEECH]": (
         "- Structure: Introduction, 3–4 main sections, Conclusion\n"
-        "- Tone: confident, inspiring, story-driven\n\n"
-        "2) LINKEDIN POST:\n"
+        "- Tone: confident, inspiring, story-driven\n"
+    ),
+    "[LINKEDIN POST]": (
         "- Structure: 2-line hook, 4–6 lines of insight, 1-line takeaway or CTA\n"
-        "- Tone: conversational, practical, shareable\n\n"
-        "3) YOUTUBE SCRIPT (5–7 min):\n"
+        "- Tone: conversational, practical, shareable\n"
+    ),
+    "[YOUTUBE SCRIPT]": (
+        "- Length: 5–7 min\n"
         "- Parts: Hook, Setup, Main Content (3 chapters), Recap, Outro/CTA\n"
-        "- Include stage directions like [B-ROLL], [ON SCREEN TEXT] sparingly.\n\n"
-        "4) SLIDE OUTLINE:\n"
-        "- Provide slide titles and 3–5 bullets per slide.\n"
-        "- Aim for 8–12 slides total.\n\n"
-        "Clearly label each section with a heading like:\n"
-        "[KEYNOTE SPEECH]\n"
-        "[LINKEDIN POST]\n"
-        "[YOUTUBE SCRIPT]\n"
-        "[SLIDE OUTLINE]\n"
+        "- Include stage directions like [B-ROLL], [ON SCREEN TEXT] sparingly.\n"
     ),
-    expected_output=(
-        "A single combined document containing all six sections, each clearly labeled with the specified headings."
+    "[SLIDE OUTLINE]": (
+        "- Provide slide titles and 3–5 bullets per slide.\n"
+        "- Aim for 8–12 slides total.\n"
     ),
-    output_file= f"{OUTPUT_DIR}/03_multiformat_content_pack_raw.txt",
-    agent=formatter,
+}
+
+# Short name of each format, used as its TOKEN_BUDGET key
+FORMAT_SLUGS = {
+    "[KEYNOTE SPEECH]": "keynote",
+    "[LINKEDIN POST]": "linkedin",
+    "[YOUTUBE SCRIPT]": "youtube",
+    "[SLIDE OUTLINE]": "slides",
+}
+
+
+def build_format_prompt(heading: str, narrative: str) -> str:
+    """Build the formatter prompt that turns the core narrative into one content format."""
+    channel = heading.strip("[]")  # "[KEYNOTE SPEECH]" -> "KEYNOTE SPEECH"
+    return (
+        f"{FORMATTER_PERSONA}\n\n"
+        f"Based on the core narrative given after the --- line, create a {channel}.\n\n"
+        f"{FORMAT_SPECS[heading]}\n"
+        f"Return only the {channel.lower()} itself, without a heading or any commentary, "
+        f"and end it with a blank line followed by {END_MARKER}.\n\n"
+        f"---\nTopic: {TOPIC}\n\n"
+        f"Core narrative:\n{narrative}\n"
+    )
+
+
+# Task 4 – Edit and polish the content pack
+# The editor cleans up and refines each format separately, starting on a format
+# as soon as its draft is ready.
+EDIT_RULES = (
+    "Rules:\n"
+    "- Improve wording, remove repetition, and tighten long sentences.\n"
+    "- Keep the tone expert, friendly, and clear, consistent with the rest of the content pack.\n"
+    "- Fix any obvious logical inconsistencies or contradictions.\n"
+    "- Keep the structure and format of the original.\n"
 )
 
-# Task 4 – Edit and polish the full content pack
-# The editor cleans up and refines the combined multi-format content.
-task_edit = Task(
-    description=(
-        "Take the multi-format content pack and polish it for clarity, flow, and impact.\n\n"
-        "Rules:\n"
-        "- Keep the four sections and their headings.\n"
-        "- Improve wording, remove repetition, and tighten long sentences.\n"
-        "- Ensure the tone is consistent across formats (expert, friendly, clear).\n"
-        "- Fix any obvious logical inconsistencies or contradictions."
-    ),
-    expected_output=(
-        "A final, polished content pack with the same six labeled sections, ready for real-world use."
-    ),
-    output_file=f"{OUTPUT_DIR}/04_multiformat_content_pack_final.txt",
-    agent=editor,
+
+def build_edit_prompt(heading: str, draft: str) -> str:
+    """Build the editor prompt that polishes one drafted content format."""
+    channel = heading.strip("[]")
+    return (
+        f"{EDITOR_PERSONA}\n\n"
+        f"{EDIT_RULES}\n"
+        f"Return only the polished text, without a heading or any commentary, "
+        f"and end it with a blank line followed by {END_MARKER}.\n\n"
+        f"Polish the {channel.lower()} given after the --- line for clarity, flow, and impact.\n\n"
+        f"---\n{channel}:\n{draft}\n"
+    )
+
+
+# Quality gate for the editor: drafts that are long, repetitive, or still full of markdown
+# get the 70B editor; everything else is polished by the smaller, faster model.
+HEAVY_EDIT_MAX_CHARS = 6000        # longer drafts need more restructuring than wording fixes
+HEAVY_EDIT_REPETITION = 0.15       # share of word bigrams that are repeats
+MARKDOWN_MARKERS = ("**", "##", "```", "__")
+
+
+def needs_heavy_edit(draft: str) -> bool:
+    """Return True if the draft should be edited by the large model instead of the small one."""
+    if len(draft) > HEAVY_EDIT_MAX_CHARS:
+        return True
+
+    if any(marker in draft for marker in MARKDOWN_MARKERS):
+        return True
+
+    # Repetition ratio: how many word bigrams occur more than once
+    words = draft.lower().split()
+    bigrams = Counter(zip(words, words[1:]))
+    total = sum(bigrams.values())
+    repeated = sum(count - 1 for count in bigrams.values() if count > 1)
+    return total > 0 and repeated / total > HEAVY_EDIT_REPETITION
+
+
+# Fused Task 3 + Task 4 (default)
+# One call per format that drafts and then self-polishes, so each format is generated once
+# instead of being drafted, sent back, and re-encoded by a separate editor call.
+# Same as EDIT_RULES, minus the rule about keeping an original the fused prompt never supplies.
+REVISION_RULES = (
+    "Revision rules:\n"
+    "- Improve wording, remove repetition, and tighten long sentences.\n"
+    "- Keep the tone expert, friendly, and clear, consistent with the rest of the content pack.\n"
+    "- Fix any obvious logical inconsistencies or contradictions.\n"
+    "- Keep the structure required above.\n"
 )
 
+
+def build_fused_prompt(heading: str, narrative: str) -> str:
+    """Build one prompt that drafts a content format and polishes it before answering."""
+    channel = heading.strip("[]")
+    return (
+        f"{WRITER_EDITOR_PERSONA}\n\n"
+        f"Based on the core narrative given after the --- line, create a {channel}.\n\n"
+        f"{FORMAT_SPECS[heading]}\n"
+        f"Then revise your draft for clarity, flow, and impact.\n\n"
+        f"{REVISION_RULES}\n"
+        f"Return ONLY the polished {channel.lower()}, without a heading, draft, or any commentary, "
+        f"and end it with a blank line followed by {END_MARKER}.\n\n"
+        f"---\nTopic: {TOPIC}\n\n"
+        f"Core narrative:\n{narrative}\n"
+    )
+
+
+def format_content_pack(sections: dict) -> str:
+    """Join {heading: text} into one labeled content pack, e.g. "[KEYNOTE SPEECH]\n...".
+
+    This is the format save_sections_to_files() splits on.
+    """
+    return "\n\n".join(f"{heading}\n{text.strip()}" for heading, text in sections.items())
+
+
+def generate_content_pack(narrative: str) -> str:
+    """Run Task 3 and Task 4 as one draft-then-polish call per format on the core narrative.
+
+    The four fused prompts are sent to watsonx concurrently, each with its format's TOKEN_BUDGET.
+    Returns the final labeled content pack and writes it to OUTPUT_DIR (there is no raw pack;
+    run with --two-stage for that).
+    """
+    headings = list(FORMAT_SPECS)
+    prompts = [build_fused_prompt(h, narrative) for h in headings]
+    llms = [get_fmt_llm(FMT_MODEL_ID, TOKEN_BUDGET[FORMAT_SLUGS[h]]) for h in headings]
+
+    sections = dict(generate_as_completed(llms, prompts, labels=headings))
+    final_pack = format_content_pack({h: sections[i] for i, h in enumerate(headings)})
+    FINAL_PACK_FILE.write_text(final_pack)
+
+    return final_pack
+
+
+def generate_content_pack_two_stage(narrative: str) -> str:
+    """Run Task 3 (formatter) and Task 4 (editor) on the core narrative as separate calls.
+
+    The four format prompts are sent to watsonx concurrently, each with its own TOKEN_BUDGET,
+    and each draft is handed to the editor as soon as it finishes, so editing the first formats
+    overlaps with generating the rest: the two stages take about max(format, edit) per format
+    instead of their sum.
+    Drafts that pass the needs_heavy_edit() gate are polished by the smaller editor model.
+    Returns the final labeled content pack and writes the raw and final packs to OUTPUT_DIR.
+    """
+    headings = list(FORMAT_SPECS)
+    drafts = {}
+    edits = {}
+
+    # Task 3 produces drafts; Task 4 consumes each one as it arrives
+    with ThreadPoolExecutor(max_workers=len(headings)) as editor_pool:
+        format_prompts = [build_format_prompt(h, narrative) for h in headings]
+        format_llms = [get_fmt_llm(FMT_MODEL_ID, TOKEN_BUDGET[FORMAT_SLUGS[h]]) for h in headings]
+        # Build both editors before any draft arrives, so handing a draft off never waits on a model lookup
+        heavy_editor, light_editor = get_fmt_llm(EDIT_MODEL_ID), get_editor_llm_small()
+        for index, draft in generate_as_completed(format_llms, format_prompts, labels=headings):
+            heading = headings[index]
+            drafts[heading] = draft
+            editor_llm = heavy_editor if needs_heavy_edit(draft) else light_editor
+            edits[heading] = editor_pool.submit(
+                generate_text, editor_llm, build_edit_prompt(heading, draft), f"{heading} edit"
+            )
+
+        # Keep the FORMAT_SPECS order in the packs regardless of completion order
+        RAW_PACK_FILE.write_text(format_content_pack({h: drafts[h] for h in headings}))
+
+        final_pack = format_content_pack({h: edits[h].result() for h in headings})
+
+    FINAL_PACK_FILE.write_text(final_pack)
+
+    return final_pack
+
 # ================================
 # CREW
 # ================================
 
-# Crew orchestrates the agents and tasks in a pipeline.
+# Crew orchestrates the agentic part of the pipeline (research + core narrative).
 # The order of tasks defines the flow of information.
 crew = Crew(
-    agents=[researcher, core_writer, formatter, editor],
-    tasks=[task_research, task_core_narrative, task_multiformat, task_edit],
+    agents=[researcher, core_writer],
+    tasks=[task_research, task_core_narrative],
     verbose=1,  # higher verbosity -> more logging about task execution
 )
 
-def save_sections_to_files(full_text: str):
+# Thread pool for writing output files (section .txt files, the .pptx deck).
+# The writes are independent, so they can run side by side instead of one after another.
+file_writer_pool = ThreadPoolExecutor(max_workers=4)
+
+
+# Matches a section marker line such as "[KEYNOTE SPEECH]" (surrounding spaces allowed).
+# group(1) is the marker; a section's body runs from the end of its match to the start of the next.
+SECTION_RE = re.compile(
+    r"^[ \t]*(" + "|".join(re.escape(marker) for marker in FORMAT_SPECS) + r")[ \t]*$",
+    re.MULTILINE,
+)
+
+
+def save_sections_to_files(full_text: str) -> None:
     """Split the final content pack into separate files per section.
 
     The function:
-    - Looks for section markers (e.g., [KEYNOTE SPEECH])
-    - Collects lines under each marker
+    - Finds the section markers (e.g., [KEYNOTE SPEECH]) with one regex scan
+    - Slices the text under each marker directly out of full_text using the match offsets
     - Writes each section to its own .txt file
     """
-    # Markers that identify the beginning of each section in the final content
-    markers = [
-        "[KEYNOTE SPEECH]",
-        "[LINKEDIN POST]",
-        "[YOUTUBE SCRIPT]",
-        "[SLIDE OUTLINE]",
-    ]
-
-    # Dictionary mapping each marker to a list of lines
-    sections = {m: [] for m in markers}
-    current = None  # tracks which section we are currently populating
-
-    # Iterate through the full text line by line
-    for line in full_text.splitlines():
-        stripped = line.strip()
-        # If the line is exactly one of the markers, switch current section
-        if stripped in markers:
-            current = stripped
-            continue
-        # If we are within a known section, append the line to that section
-        if current:
-            sections[current].append(line)
-
-    # Write each populated section to its own file
-    for marker, lines in sections.items():
-        if not lines:
+    matches = list(SECTION_RE.finditer(full_text))
+    ends = [match.start() for match in matches[1:]] + [len(full_text)]
+
+    # Dictionary mapping each marker to its text; anything before the first marker is ignored.
+    # A marker that appears twice gets both bodies, in order.
+    sections: Dict[str, str] = {}
+    for match, end in zip(matches, ends):
+        marker = match.group(1)
+        sections[marker] = sections.get(marker, "") + full_text[match.end():end]
+
+    # Map each populated section to its output file
+    files: Dict[str, Tuple[str, str]] = {}
+    for marker, body in sections.items():
+        body = body.strip()
+        if not body:
             continue  # model might skip a section sometimes
         # Convert marker like "[KEYNOTE SPEECH]" -> "keynote_speech.txt"
         filename = marker.strip("[]").lower().replace(" ", "_") + ".txt"
-        with open(f"{OUTPUT_DIR}/{filename}", "w") as f:
-            f.write("\n".join(lines).strip())
-        print(f"Saved {marker} to {filename}")
+        files[marker] = (filename, body)
+
+    # Write all section files concurrently; map() returns once every write has finished
+    list(file_writer_pool.map(lambda item: (OUTPUT_DIR / item[0]).write_text(item[1]), files.values()))
+    if files:
+        log.info("\n".join(f"Saved {marker} to {filename}" for marker, (filename, _) in files.items()))
+
+
+# Leading bullet characters in a slide outline line, e.g. "- ", "• ", "-- "
+BULLET_RE = re.compile(r"^[-•\s]+")
 
 
-def build_slides_from_outline(outline_path=f"{OUTPUT_DIR}/slide_outline.txt", pptx_path=f"{OUTPUT_DIR}/slides.pptx"):
+def iter_outline_blocks(outline_path: Path):
+    """Yield each slide block of the outline as a list of stripped, non-blank lines.
+
+    The file is read line by line and blocks are separated by blank lines, so only one
+    block is held in memory at a time instead of the whole outline text.
+    """
+    with outline_path.open() as f:
+        for has_text, group in groupby(f, key=lambda line: bool(line.strip())):
+            if has_text:
+                yield [line.strip() for line in group]
+
+
+def build_slides_from_outline(outline_path: Path = SLIDE_OUTLINE_FILE, pptx_path: Path = SLIDES_FILE):
     """Build a PPTX deck from the slide outline text file.
 
     Expected outline format:
     - Each slide is a block separated by a blank line.
     - First line of block: 'Slide X: Title' or just 'Title'
     - Subsequent lines: bullet points (optionally prefixed with '-', '•', etc.)
+
+    The deck is built in the calling thread (python-pptx is not thread-safe), but saved on
+    file_writer_pool. Returns the Future of that save, or None if no deck was built.
     """
     # Check if the outline file exists before proceeding
-    if not os.path.exists(outline_path):
-        print(f"[slides] No slide outline file found at {outline_path}. Skipping PPTX generation.")
-        return
-
-    # Read the entire outline content
-    with open(outline_path, "r") as f:
-        text = f.read()
-
-    # Split slides by blank lines into "blocks"
-    blocks = [b.strip() for b in text.split("\n\n") if b.strip()]
-
-    if not blocks:
-        print("[slides] Slide outline is empty, nothing to build.")
+    if not outline_path.exists():
+        log.info(f"[slides] No slide outline file found at {outline_path}. Skipping PPTX generation.")
         return
 
     # Initialize a new PowerPoint presentation
     prs = Presentation()
 
-    # Process each slide block
-    for block in blocks:
-        # Split block into lines and clean whitespace
-        lines = [line.strip() for line in block.splitlines() if line.strip()]
-        if not lines:
-            continue
+    # Use "Title and Content" layout (index 1) for each slide; looked up once for the whole deck
+    slide_layout = prs.slide_layouts[1]
 
+    # Process each slide block as soon as it has been read from the file
+    for title_line, *bullet_lines in iter_outline_blocks(outline_path):
         # First line: "Slide X: Title"  -> extract title after colon if present
-        raw_title = lines[0]
-        if ":" in raw_title:
-            title = raw_title.split(":", 1)[1].strip()
-        else:
-            title = raw_title
+        title = title_line.partition(":")[2].strip() or title_line
 
         # Remaining lines are bullet points; strip any leading bullet characters
-        bullet_lines = [l.lstrip("-• ").strip() for l in lines[1:]]
+        bullets = [bullet for bullet in (BULLET_RE.sub("", line) for line in bullet_lines) if bullet]
 
-        # Use "Title and Content" layout (index 1) for each slide
-        slide_layout = prs.slide_layouts[1]
         slide = prs.slides.add_slide(slide_layout)
         slide.shapes.title.text = title
 
-        # Add bullet points to the content placeholder
-        body = slide.placeholders[1].text_frame
-        first = True
-        for bullet in bullet_lines:
-            if not bullet:
-                continue
-            if first:
-                # The first bullet sets the initial text of the text_frame
-                body.text = bullet
-                first = False
-            else:
-                # Subsequent bullets become new paragraphs
-                p = body.add_paragraph()
-                p.text = bullet
-
-    # Save the generated PowerPoint file
-    prs.save(pptx_path)
-    print(f"[slides] ✅ PPTX generated: {pptx_path}")
+        # Add bullet points to the content placeholder in one assignment:
+        # python-pptx replaces the frame's (implicit) first paragraph and starts a new one per "\n"
+        slide.placeholders[1].text_frame.text = "\n".join(bullets)
+
+    if len(prs.slides) == 0:
+        log.info("[slides] Slide outline is empty, nothing to build.")
+        return
+
+    # Save the generated PowerPoint file in the background
+    def save_deck():
+        prs.save(pptx_path)
+        log.info(f"[slides] ✅ PPTX generated: {pptx_path}")
+
+    return file_writer_pool.submit(save_deck)
 
 
 if __name__ == "__main__":
     # Kick off the Crew pipeline:
     # 1) task_research
     # 2) task_core_narrative
-    # 3) task_multiformat
-    # 4) task_edit
-    final_result = crew.kickoff()
+    core_narrative = crew.kickoff()
+
+    # Then the content pack stages, fused into one call per format unless --two-stage:
+    # 3) formatter (keynote / linkedin / youtube / slides)
+    # 4) editor
+    if args.two_stage:
+        final_result = generate_content_pack_two_stage(core_narrative)
+    else:
+        final_result = generate_content_pack(core_narrative)
 
-    # Print the final consolidated result to stdout
-    print("\n========== FINAL RESULT ==========\n")
-    print(final_result)
+    # Print the final consolidated result to stdout in a single write
+    sys.stdout.write(f"\n========== FINAL RESULT ==========\n\n{final_result}\n")
+    sys.stdout.flush()
 
     # Split the final content into separate text files by section markers
     save_sections_to_files(final_result)
     
     # Build slides.pptx from slide_outline.txt (if it exists and is well-formed)
-    build_slides_from_outline(outline_path=f"{OUTPUT_DIR}/slide_outline.txt", pptx_path=f"{OUTPUT_DIR}/slides.pptx")
+    deck_saved = build_slides_from_outline(outline_path=SLIDE_OUTLINE_FILE, pptx_path=SLIDES_FILE)
+
+    # Wait for the background save so any error surfaces before the script exits
+    if deck_saved is not None:
+        deck_saved.result()
@@ -0,0 +1,56 @@
+# Concurrent text generation on IBM watsonx.ai
+#
+# CrewAI runs every task through an agent loop that issues one LLM request at a time.
+# For plain prompt-in / text-out steps it is cheaper to send all prompts to watsonx at once.
+# generate_as_completed() issues them as concurrent requests and yields each result as soon
+# as it is done, so a follow-up step can start on it while the rest are still generating.
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+from langchain_ibm import WatsonxLLM
+
+log = logging.getLogger(__name__)
+
+# Same limit the watsonx SDK applies to concurrent requests in a ModelInference.generate() call
+MAX_CONCURRENCY = 10
+
+
+def generate_text(llm: WatsonxLLM, prompt: str, label: str = "") -> str:
+    """Generate one completion, logging a warning if it was cut off at max_new_tokens.
+
+    watsonx reports why generation stopped; "max_tokens" means the budget ran out before the
+    model finished (or reached a stop sequence), so the returned text is truncated.
+    """
+    generation = llm.generate([prompt]).generations[0][0]
+    if (generation.generation_info or {}).get("finish_reason") == "max_tokens":
+        model_params = llm.params or getattr(llm.watsonx_model, "params", None) or {}
+        max_new_tokens = model_params.get("max_new_tokens")
+        log.warning(f"[truncated] {label or 'Output'} hit max_new_tokens={max_new_tokens} and was cut off")
+    return generation.text
+
+
+def generate_as_completed(
+    llm: Union[WatsonxLLM, Sequence[WatsonxLLM]],
+    prompts: List[str],
+    labels: Optional[List[str]] = None,
+) -> Iterator[Tuple[int, str]]:
+    """Generate all prompts concurrently and yield (index, text) as each one finishes.
+
+    `llm` is either one LLM for every prompt or one LLM per prompt (e.g. with different
+    max_new_tokens). `labels` name the prompts in truncation warnings, see generate_text().
+    `index` is the prompt's position in `prompts`; results arrive in completion order.
+    """
+    if not prompts:
+        return
+
+    llms = [llm] * len(prompts) if isinstance(llm, WatsonxLLM) else list(llm)
+    labels = labels or [f"Prompt {index}" for index in range(len(prompts))]
+
+    with ThreadPoolExecutor(max_workers=min(len(prompts), MAX_CONCURRENCY)) as executor:
+        futures = {
+            executor.submit(generate_text, model, prompt, label): index
+            for index, (model, prompt, label) in enumerate(zip(llms, prompts, labels))
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()